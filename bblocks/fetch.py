@@ -1,14 +1,25 @@
 import argparse
-import json
+import hashlib
+import math
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 from urllib.parse import urljoin, urlparse
 
+import orjson
 import requests
-from shapely.geometry import shape as shapely_shape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import yaml
 
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
 import sys
 
 DEFAULT_DATA_DIR = Path('data')
@@ -16,117 +27,407 @@ STAC_SUBDIR = 'stac'
 
 DEFAULT_PYGEOAPI_CONFIG_FN = 'pygeoapi.config.yml'
 OUTPUT_SUBDIR = 'bblocks'
+CACHE_SUBDIR = '.cache'
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+FETCH_WORKERS = 16
+FETCH_TIMEOUT = 30
+WRITE_WORKERS = 8
+VALIDATOR_HEADERS = {
+    'ETag': 'If-None-Match',
+    'Last-Modified': 'If-Modified-Since',
+}
+
+_SAFE_RE = re.compile(r'[^a-zA-Z0-9._-]+')
+
+# building block documents of all registers are fetched through a single
+# pool, so that at most FETCH_WORKERS bblock requests plus one request per
+# register thread (also capped to FETCH_WORKERS) are in flight at a time
+_FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=FETCH_WORKERS,
+    pool_maxsize=2 * FETCH_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3),
+)
+_SESSION.mount('http://', _ADAPTER)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.headers.update({
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+})
 
 
 def safe_filename(s: str):
-    return re.sub(r'[^a-zA-Z0-9._-]+', '_', s)
+    return _SAFE_RE.sub('_', s)
 
 
 def get_register_name(url: str):
     parsed = urlparse(url)
+    return f"{safe_filename(parsed.hostname)}_{safe_filename(parsed.path)}"
+
+
+def write_bytes_atomic(fn: Path, data: bytes):
+    tmp_fn = fn.with_name(f'.{fn.name}.{threading.get_ident()}.tmp')
+    try:
+        tmp_fn.write_bytes(data)
+        os.replace(tmp_fn, fn)
+    except BaseException:
+        tmp_fn.unlink(missing_ok=True)
+        raise
+
+
+def write_if_changed(fn: Path, data: bytes, atomic=True):
+    """
+    Writes data to fn, unless fn already has that exact content.
+
+    Files that are not owned by this script (e.g. a bind-mounted or
+    symlinked pygeoapi config) must be written with atomic=False, so
+    that they are updated in place instead of being replaced.
+    """
+    try:
+        if fn.stat().st_size == len(data) and fn.read_bytes() == data:
+            return
+    except FileNotFoundError:
+        pass
+    if atomic:
+        write_bytes_atomic(fn, data)
+    else:
+        with open(fn, 'wb') as f:
+            f.write(data)
+
+
+def get_etag_fn(fn: Path) -> Path:
+    return fn.with_name(fn.name + '.etag')
+
+
+def get_hash_fn(fn: Path) -> Path:
+    return fn.with_name(fn.name + '.hash')
 
-    def clean(s: str):
-        return re.sub(r'[^a-zA-Z0-9._-]+', '_', s)
 
-    return f"{clean(parsed.hostname)}_{clean(parsed.path)}"
+def get_register_hash(register: dict) -> str:
+    return hashlib.blake2b(
+        orjson.dumps(register, option=orjson.OPT_SORT_KEYS)).hexdigest()
 
 
-def fetch_json(url):
-    r = requests.get(url)
+def read_validators(etag_fn: Path) -> dict:
+    if not etag_fn.is_file():
+        return {}
+    return orjson.loads(etag_fn.read_bytes())
+
+
+def write_validators(etag_fn: Path, validators: dict):
+    write_if_changed(etag_fn,
+                     orjson.dumps(validators, option=orjson.OPT_INDENT_2))
+
+
+def fetch_json_conditional(url, validators: dict | None = None):
+    """
+    Fetches a JSON document, sending the given validators (if any)
+    so that the server can reply with 304 Not Modified.
+
+    :returns: tuple of (document, validators), or (None, None) when the
+              document has not been modified
+    """
+    headers = {}
+    for header, conditional_header in VALIDATOR_HEADERS.items():
+        if value := (validators or {}).get(header):
+            headers[conditional_header] = value
+    r = _SESSION.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+    if r.status_code == 304:
+        return None, None
     r.raise_for_status()
-    return r.json()
+    validators = {header: r.headers[header]
+                  for header in VALIDATOR_HEADERS if header in r.headers}
+    return orjson.loads(r.content), validators
+
+
+def get_bblock_cache_key(bblock_entry: dict) -> str:
+    return hashlib.blake2b(
+        orjson.dumps(bblock_entry, option=orjson.OPT_SORT_KEYS),
+        digest_size=16).hexdigest()
+
+
+def fetch_bblock(bblock_entry: dict, cache_dir: Path, force=False):
+    """
+    Retrieves the full JSON document for a register entry. Documents are
+    cached under the hash of the entry, so unchanged entries are never
+    fetched again; otherwise, a conditional request is made against the
+    last cached version of the building block.
+    """
+    cache_key = get_bblock_cache_key(bblock_entry)
+    cache_fn = cache_dir / f'{cache_key}.json'
+    if not force and cache_fn.is_file():
+        os.utime(cache_fn)
+        return orjson.loads(cache_fn.read_bytes())
+
+    # validators (and the cached document they refer to) are only valid
+    # for the URL they were obtained from
+    bblock_url = bblock_entry['documentation']['json-full']['url']
+    url_hash = hashlib.blake2b(bblock_url.encode(),
+                               digest_size=16).hexdigest()
+    etag_fn = cache_dir.joinpath(
+        f"{safe_filename(bblock_entry['itemIdentifier'])}-{url_hash}.etag")
+    last_validators = {} if force else read_validators(etag_fn)
+    last_cache_fn = None
+    if last_cache_key := last_validators.get('cacheKey'):
+        last_cache_fn = cache_dir / f'{last_cache_key}.json'
+        if not last_cache_fn.is_file():
+            last_cache_fn, last_validators = None, {}
+
+    bblock, validators = fetch_json_conditional(bblock_url, last_validators)
+    if bblock is None:
+        data = last_cache_fn.read_bytes()
+        bblock = orjson.loads(data)
+        validators = last_validators
+    else:
+        data = orjson.dumps(bblock)
+    write_bytes_atomic(cache_fn, data)
+    write_validators(etag_fn, {**validators, 'cacheKey': cache_key})
+    return bblock
+
+
+def evict_cache(cache_dir: Path, max_bytes=CACHE_MAX_BYTES):
+    """
+    Removes the least recently used cached documents until the
+    cache takes up at most max_bytes, together with the validators
+    that refer to documents no longer in the cache.
+    """
+    entries = []
+    for cache_fn in cache_dir.glob('*.json'):
+        st = cache_fn.stat()
+        entries.append((st.st_atime, st.st_size, cache_fn))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, cache_fn in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        cache_fn.unlink(missing_ok=True)
+        total_size -= size
+
+    for etag_fn in cache_dir.glob('*.etag'):
+        cache_key = read_validators(etag_fn).get('cacheKey')
+        if not (cache_key
+                and cache_dir.joinpath(f'{cache_key}.json').is_file()):
+            etag_fn.unlink(missing_ok=True)
+
+
+def _iter_positions(geom: dict) -> Iterator[list[float]]:
+    geom_type = geom['type']
+    if geom_type == 'GeometryCollection':
+        for member in geom['geometries']:
+            yield from _iter_positions(member)
+        return
+    coords = geom['coordinates']
+    if geom_type == 'Point':
+        if coords:
+            yield coords
+    elif geom_type in ('LineString', 'MultiPoint'):
+        yield from coords
+    elif geom_type == 'Polygon':
+        # the exterior ring contains all the others
+        yield from coords[0] if coords else ()
+    elif geom_type == 'MultiLineString':
+        for line in coords:
+            yield from line
+    elif geom_type == 'MultiPolygon':
+        for polygon in coords:
+            yield from polygon[0] if polygon else ()
+
+
+def _geojson_bounds(geom: dict) -> tuple[float, float, float, float]:
+    minx = miny = math.inf
+    maxx = maxy = -math.inf
+    for position in _iter_positions(geom):
+        x, y = position[0], position[1]
+        if x < minx:
+            minx = x
+        if x > maxx:
+            maxx = x
+        if y < miny:
+            miny = y
+        if y > maxy:
+            maxy = y
+    return float(minx), float(miny), float(maxx), float(maxy)
+
+
+def get_unique_id(base_id: str, id_counts: dict[str, int]) -> str:
+    """
+    Returns base_id, or base_id suffixed with _2, _3... if it has already
+    been used, and records the returned id in id_counts.
+    """
+    n = id_counts.get(base_id, 0)
+    unique_id = base_id if n == 0 else f'{base_id}_{n + 1}'
+    while unique_id in id_counts:
+        # clashes with another original id
+        n += 1
+        unique_id = f'{base_id}_{n + 1}'
+    id_counts[base_id] = n + 1
+    id_counts.setdefault(unique_id, 1)
+    return unique_id
+
+
+def ensure_dir(path: Path, created_dirs: set[Path]):
+    if path not in created_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        created_dirs.add(path)
+
+
+def write_json_files(outputs: Iterable[tuple[Path, dict | bytes]]):
+    def write(output):
+        fn, contents = output
+        if not isinstance(contents, bytes):
+            contents = orjson.dumps(contents, option=orjson.OPT_INDENT_2)
+        write_if_changed(fn, contents)
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        # consume the results so that any error is raised
+        list(executor.map(write, outputs))
 
 
 def get_envelop_bbox(collections: Iterable[dict]) \
         -> tuple[float, float, float, float]:
-    envelope_bbox = None, None, None, None
-
-    def get_updated_bbox(g):
-        bbox = shapely_shape(g).bounds
-        return (
-            bbox[0] if envelope_bbox[0] is None
-            else min(envelope_bbox[0], bbox[0]),
-            bbox[1] if envelope_bbox[1] is None
-            else min(envelope_bbox[1], bbox[1]),
-            bbox[2] if envelope_bbox[2] is None
-            else max(envelope_bbox[2], bbox[2]),
-            bbox[3] if envelope_bbox[3] is None
-            else max(envelope_bbox[3], bbox[3]),
-        )
-
+    minx = miny = math.inf
+    maxx = maxy = -math.inf
     for entry in collections:
         if geom := entry.get('geometry'):
-            envelope_bbox = get_updated_bbox(geom)
-        elif features := entry.get('features'):
-            for feature in features:
-                if geom := feature.get('geometry'):
-                    envelope_bbox = get_updated_bbox(geom)
-    return envelope_bbox
+            geoms = (geom,)
+        else:
+            geoms = (feature['geometry']
+                     for feature in entry.get('features') or ()
+                     if feature.get('geometry'))
+        for geom in geoms:
+            bx0, by0, bx1, by1 = _geojson_bounds(geom)
+            if bx0 < minx:
+                minx = bx0
+            if by0 < miny:
+                miny = by0
+            if bx1 > maxx:
+                maxx = bx1
+            if by1 > maxy:
+                maxy = by1
+    if minx == math.inf:
+        return None, None, None, None
+    return minx, miny, maxx, maxy
+
+
+def _ld_config(ld_context, fallback_sparql: str | None = None) -> dict:
+    ld_config = {
+        'inject_verbatim_context': True,
+        'replace_id_field': 'id',
+        'context': [
+            ld_context
+        ]
+    }
+    if fallback_sparql:
+        ld_config['fallback_sparql_endpoint'] = fallback_sparql
+    return ld_config
 
 
 def process_register(register_url: str, register_fn: Path,
                      data_dir: Path, fallback_sparql: str | None = None,
                      force=False):
-    new_register = fetch_json(register_url)
+    needs_update = not register_fn.is_file() or force
 
-    output_dir = data_dir / OUTPUT_SUBDIR
-    stac_dir = data_dir / STAC_SUBDIR
+    new_register, validators = fetch_json_conditional(
+        register_url,
+        None if needs_update else read_validators(get_etag_fn(register_fn)))
+    if new_register is None:
+        return False
 
-    needs_update = not register_fn.is_file() or force
+    output_base = str(data_dir / OUTPUT_SUBDIR)
+    stac_dir = data_dir / STAC_SUBDIR
+    cache_dir = data_dir / CACHE_SUBDIR
 
     if not needs_update:
-        with open(register_fn) as f:
-            last_register = json.load(f)
-        needs_update = last_register != new_register
+        hash_fn = get_hash_fn(register_fn)
+        needs_update = (not hash_fn.is_file()
+                        or hash_fn.read_text()
+                        != get_register_hash(new_register))
 
     if not needs_update:
+        write_validators(get_etag_fn(register_fn), validators)
         return False
 
     fallback_sparql = new_register.get('sparqlEndpoint', fallback_sparql)
 
     output_resources = {}
+    output_files = []
+    created_dirs = set()
 
+    # the same building block may be listed more than once,
+    # so only fetch and process each document once
+    bblock_entries = {}
     for bblock_entry in new_register['bblocks']:
-        bblock = fetch_json(bblock_entry['documentation']['json-full']['url'])
+        bblock_entries.setdefault(
+            bblock_entry['documentation']['json-full']['url'], bblock_entry)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    bblock_jsons = dict(zip(bblock_entries, _FETCH_EXECUTOR.map(
+        lambda e: fetch_bblock(e, cache_dir, force),
+        bblock_entries.values())))
+
+    for bblock in bblock_jsons.values():
         bblock_id = bblock['itemIdentifier']
+        # serialized feature collections and the geometries in each of them
         bblock_feature_collections = {}
+        bblock_geometries = {}
+        bblock_features = []
         bblock_stac_items = []
         for i, example in enumerate(bblock.get('examples', [])):
-            for snippet in example.get('snippets', []):
-                if snippet.get('language') in ('json',):
-                    snippet_code = json.loads(snippet['code'])
-                    if not isinstance(snippet_code, dict):
-                        continue
-                    if not (snippet_type := snippet_code.get('type')):
-                        continue
-                    if viewer_url := new_register.get('viewerURL'):
-                        snippet_code.setdefault('links', []).append({
-                            'type': 'text/html',
-                            'rel': '',
-                            'title': 'Source Building Block',
-                            'href': urljoin(viewer_url, f'bblock/{bblock_id}'),
+            for j, snippet in enumerate(example.get('snippets', [])):
+                if snippet.get('language') != 'json':
+                    continue
+                code = snippet.get('code')
+                # only JSON objects are of interest
+                if not code or code.lstrip()[:1] != '{':
+                    continue
+                snippet_code = orjson.loads(code)
+                if not (snippet_type := snippet_code.get('type')):
+                    continue
+                if viewer_url := new_register.get('viewerURL'):
+                    snippet_code.setdefault('links', []).append({
+                        'type': 'text/html',
+                        'rel': '',
+                        'title': 'Source Building Block',
+                        'href': urljoin(viewer_url, f'bblock/{bblock_id}'),
+                    })
+                if snippet_type == 'Feature':
+                    if snippet_code.get('stac_version'):
+                        # STAC item
+                        bblock_stac_items.append({
+                            'ref': snippet.get('ref'),
+                            'code': snippet_code
                         })
-                    if snippet_type == 'Feature':
-                        if snippet_code.get('stac_version'):
-                            # STAC item
-                            bblock_stac_items.append({
-                                'ref': snippet.get('ref'),
-                                'code': snippet_code
-                            })
-                        else:
-                            fc = bblock_feature_collections.setdefault('', {})
-                            if not fc:
-                                fc.update({
-                                    'type': 'FeatureCollection',
-                                    'features': []
-                                })
-                            fc['features'].append(snippet_code)
-                    elif snippet_code == 'FeatureCollection':
-                        bblock_feature_collections[str(i)] = snippet_code
+                    else:
+                        # serialized once all the features are known
+                        bblock_feature_collections.setdefault('', None)
+                        bblock_features.append(orjson.dumps(snippet_code))
+                        bblock_geometries.setdefault('', []).append(
+                            {'geometry': snippet_code.get('geometry')})
+                elif snippet_type == 'FeatureCollection':
+                    # an example may have several feature collections
+                    fc_key = f'{i}_{j}'
+                    bblock_feature_collections[fc_key] = \
+                        orjson.dumps(snippet_code)
+                    bblock_geometries[fc_key] = [
+                        {'geometry': feature.get('geometry')}
+                        for feature in snippet_code.get('features') or ()
+                    ]
+
+        if bblock_features:
+            bblock_feature_collections[''] = b''.join((
+                b'{"type":"FeatureCollection","features":[',
+                b','.join(bblock_features),
+                b']}',
+            ))
 
         if bblock_feature_collections:
 
-            bbox = get_envelop_bbox(bblock_feature_collections.values())
+            bbox = get_envelop_bbox(
+                entry
+                for entries in bblock_geometries.values()
+                for entry in entries)
 
             output_resource = {
                 'type': 'collection',
@@ -142,28 +443,15 @@ def process_register(register_url: str, register_fn: Path,
             }
 
             if ld_context := bblock.get('ldContext'):
-                ld_config = {
-                    'inject_verbatim_context': True,
-                    'replace_id_field': 'id',
-                    'context': [
-                        ld_context
-                    ]
-                }
-                if fallback_sparql:
-                    ld_config['fallback_sparql_endpoint'] = fallback_sparql
-                output_resource['linked-data'] = ld_config
+                output_resource['linked-data'] = _ld_config(ld_context,
+                                                            fallback_sparql)
 
             providers = []
             for key, fc in bblock_feature_collections.items():
-                collection_fn = (output_dir.joinpath(bblock['itemIdentifier'])
-                                 .with_suffix('.geojson'))
-                if key:
-                    collection_fn = collection_fn.with_stem(
-                        collection_fn.stem + '_' + key
-                    )
-                collection_fn.parent.mkdir(parents=True, exist_ok=True)
-                with open(collection_fn, 'w') as f:
-                    json.dump(fc, f, indent=2)
+                stem = bblock['itemIdentifier'] + (f'_{key}' if key else '')
+                collection_fn = Path(f'{output_base}/{stem}.geojson')
+                ensure_dir(collection_fn.parent, created_dirs)
+                output_files.append((collection_fn, fc))
                 providers.append({
                     'type': 'feature',
                     'name': 'GeoJSON',
@@ -174,10 +462,10 @@ def process_register(register_url: str, register_fn: Path,
             output_resources[bblock['itemIdentifier']] = output_resource
 
         if bblock_stac_items:
-            stac_dir = stac_dir / bblock['itemIdentifier']
-            stac_dir.mkdir(parents=True, exist_ok=True)
+            bblock_stac_dir = stac_dir / bblock['itemIdentifier']
+            ensure_dir(bblock_stac_dir, created_dirs)
 
-            added_items = set()
+            id_counts = {}
 
             extensions = set()
             catalog = {
@@ -194,24 +482,18 @@ def process_register(register_url: str, register_fn: Path,
             for item in bblock_stac_items:
                 item_ref = item['ref']
                 item = item['code']
-                item_id = safe_filename(item['id'])
-                while item_id in added_items:
-                    if m := re.match(r'(.+)_([0-9]+)$', item_id):
-                        item_id = f"{m.group(1)}_{int(m.group(2)) + 1}"
-                    else:
-                        item_id = f"{item_id}_2"
-                id_fn = safe_filename(item_id)
-                item_dir = stac_dir / id_fn
-                item_dir.mkdir(parents=True, exist_ok=True)
+                id_fn = get_unique_id(safe_filename(item['id']), id_counts)
+                item_dir = bblock_stac_dir / id_fn
+                ensure_dir(item_dir, created_dirs)
 
                 if item_ref:
                     for asset in item.get('assets', {}).values():
-                        if not re.match(r'^https?://', asset['href']):
+                        href = asset['href']
+                        if not href.startswith(('http://', 'https://')):
                             # relative link
-                            asset['href'] = urljoin(item_ref, asset['href'])
+                            asset['href'] = urljoin(item_ref, href)
 
-                with open(item_dir / f'{id_fn}.json', 'w') as f:
-                    json.dump(item, f, indent=2)
+                output_files.append((item_dir / f'{id_fn}.json', item))
                 catalog['links'].append({
                     'rel': 'item',
                     'href': f'./{id_fn}/{id_fn}.json'
@@ -219,8 +501,7 @@ def process_register(register_url: str, register_fn: Path,
                 extensions.update(item.get('stac_extensions', ()))
 
             catalog['stac_extensions'] = list(extensions)
-            with open(stac_dir / 'catalog.json', 'w') as f:
-                json.dump(catalog, f, indent=2)
+            output_files.append((bblock_stac_dir / 'catalog.json', catalog))
 
             output_resource = {
                 'type': 'stac-collection',
@@ -230,7 +511,7 @@ def process_register(register_url: str, register_fn: Path,
                     {
                         'type': 'stac',
                         'name': 'Hateoas',
-                        'data': str(Path('/') / stac_dir),
+                        'data': str(Path('/') / bblock_stac_dir),
                         'file_types': [
                             'catalog.json'
                         ]
@@ -238,19 +519,11 @@ def process_register(register_url: str, register_fn: Path,
                 ]
             }
             if ld_context := bblock.get('ldContext'):
-                ld_config = {
-                    'inject_verbatim_context': True,
-                    'replace_id_field': 'id',
-                    'context': [
-                        ld_context
-                    ]
-                }
-                if fallback_sparql:
-                    ld_config['fallback_sparql_endpoint'] = fallback_sparql
-                output_resource['linked-data'] = ld_config
+                output_resource['linked-data'] = _ld_config(ld_context,
+                                                            fallback_sparql)
             output_resources[bblock['itemIdentifier']] = output_resource
 
-    return output_resources, new_register
+    return output_resources, new_register, validators, output_files
 
 
 def _main():
@@ -292,46 +565,74 @@ def _main():
     data_dir.mkdir(parents=True, exist_ok=True)
     data_dir.joinpath(STAC_SUBDIR).mkdir(parents=True, exist_ok=True)
 
-    new_resources = {}
-    new_registers = {}
-    for register_url in args.register:
-        register_name = get_register_name(register_url)
-        register_fn = data_dir / f'register-{register_name}'
-        if (process_result := process_register(
+    register_fns = {
+        register_url: data_dir / f'register-{get_register_name(register_url)}'
+        for register_url in args.register
+    }
+    with ThreadPoolExecutor(
+            max_workers=min(len(register_fns), FETCH_WORKERS)) as executor:
+        futures = {
+            register_url: executor.submit(
+                process_register,
                 register_url=register_url,
                 register_fn=register_fn,
                 data_dir=data_dir,
                 fallback_sparql=args.fallback_sparql,
-                force=args.force)) is not False:
-            new_resources_register, new_register = process_result
+                force=args.force)
+            for register_url, register_fn in register_fns.items()
+        }
+
+    # registers share the building block cache, so only evict
+    # once all of them have been processed
+    evict_cache(data_dir / CACHE_SUBDIR)
+
+    new_resources = {}
+    new_registers = {}
+    output_files = {}
+    # merge in command line order: registers listing the same building block
+    # write to the same files, and the last one must win (both on disk and
+    # in the config), as it would if they were processed one after another
+    for register_url, future in futures.items():
+        register_fn = register_fns[register_url]
+        if (process_result := future.result()) is not False:
+            (new_resources_register, new_register,
+             validators, register_output_files) = process_result
             new_resources[register_url] = new_resources_register
-            new_registers[register_fn] = new_register
+            new_registers[register_fn] = new_register, validators
+            output_files.update(register_output_files)
             for resource in new_resources_register.values():
                 resource['bblocks_register'] = register_url
 
     if not new_resources:
         sys.exit(1)
 
+    write_json_files(output_files.items())
+
     with open(args.config_file) as f:
-        existing_config = yaml.safe_load(f)
+        existing_config = yaml.load(f, Loader=YamlLoader)
 
+    updated_registers = frozenset(new_resources)
     all_resources = {
         k: v
         for k, v in existing_config.setdefault('resources', {}).items()
-        if v.get('bblocks_register') not in new_resources
+        if v.get('bblocks_register') not in updated_registers
     }
-    all_resources.update({k: v
-                          for r in new_resources.values()
-                          for k, v in r.items()})
+    for register_resources in new_resources.values():
+        all_resources.update(register_resources)
     existing_config['resources'] = all_resources
 
-    with open(args.config_file, 'w') as f:
-        yaml.safe_dump(existing_config, f,
-                       default_flow_style=False, sort_keys=False)
-
-    for reg_path, reg_contents in new_registers.items():
-        with open(reg_path, 'w') as f:
-            json.dump(reg_contents, f, indent=2)
+    # left untouched if the resulting config is identical
+    write_if_changed(Path(args.config_file), yaml.dump(
+        existing_config, Dumper=YamlDumper,
+        default_flow_style=False, sort_keys=False).encode('utf-8'),
+        atomic=False)
+
+    for reg_path, (reg_contents, validators) in new_registers.items():
+        write_if_changed(reg_path, orjson.dumps(
+            reg_contents, option=orjson.OPT_INDENT_2))
+        write_if_changed(get_hash_fn(reg_path),
+                         get_register_hash(reg_contents).encode())
+        write_validators(get_etag_fn(reg_path), validators)
 
 
 if __name__ == '__main__':
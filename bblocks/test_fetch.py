@@ -0,0 +1,88 @@
+import math
+
+import pytest
+
+import fetch
+
+
+@pytest.mark.parametrize('geom, expected', [
+    pytest.param({'type': 'Point', 'coordinates': [1, 2]},
+                 (1.0, 2.0, 1.0, 2.0), id='Point'),
+    pytest.param({'type': 'Point', 'coordinates': [1, 2, 3]},
+                 (1.0, 2.0, 1.0, 2.0), id='Point-3D'),
+    pytest.param({'type': 'MultiPoint', 'coordinates': [[1, -2], [3, 4]]},
+                 (1.0, -2.0, 3.0, 4.0), id='MultiPoint'),
+    pytest.param({'type': 'LineString', 'coordinates': [[1, 2], [-3, 5]]},
+                 (-3.0, 2.0, 1.0, 5.0), id='LineString'),
+    pytest.param({'type': 'MultiLineString',
+                  'coordinates': [[[1, 2], [3, 4]], [[-1, 9], [0, 0]]]},
+                 (-1.0, 0.0, 3.0, 9.0), id='MultiLineString'),
+    pytest.param({'type': 'Polygon',
+                  'coordinates': [[[0, 0], [4, 0], [4, 4], [0, 0]],
+                                  [[1, 1], [2, 1], [2, 2], [1, 1]]]},
+                 (0.0, 0.0, 4.0, 4.0), id='Polygon'),
+    pytest.param({'type': 'MultiPolygon',
+                  'coordinates': [[[[0, 0], [4, 0], [4, 4], [0, 0]]],
+                                  [[[10, 10], [14, 10], [14, -4],
+                                    [10, 10]]]]},
+                 (0.0, -4.0, 14.0, 10.0), id='MultiPolygon'),
+    pytest.param({'type': 'GeometryCollection',
+                  'geometries': [
+                      {'type': 'Point', 'coordinates': [100, 2]},
+                      {'type': 'Point', 'coordinates': []},
+                      {'type': 'MultiPoint',
+                       'coordinates': [[1, -2], [3, 4]]},
+                  ]},
+                 (1.0, -2.0, 100.0, 4.0), id='GeometryCollection'),
+])
+def test_geojson_bounds(geom, expected):
+    bounds = fetch._geojson_bounds(geom)
+    assert bounds == expected
+    assert all(isinstance(v, float) for v in bounds)
+
+
+@pytest.mark.parametrize('geom', [
+    pytest.param({'type': 'Point', 'coordinates': []}, id='Point'),
+    pytest.param({'type': 'MultiPoint', 'coordinates': []}, id='MultiPoint'),
+    pytest.param({'type': 'LineString', 'coordinates': []}, id='LineString'),
+    pytest.param({'type': 'MultiLineString', 'coordinates': [[]]},
+                 id='MultiLineString'),
+    pytest.param({'type': 'Polygon', 'coordinates': []}, id='Polygon'),
+    pytest.param({'type': 'MultiPolygon', 'coordinates': [[]]},
+                 id='MultiPolygon'),
+    pytest.param({'type': 'GeometryCollection', 'geometries': []},
+                 id='GeometryCollection'),
+])
+def test_geojson_bounds_empty(geom):
+    assert fetch._geojson_bounds(geom) == (math.inf, math.inf,
+                                           -math.inf, -math.inf)
+    assert fetch.get_envelop_bbox([{'geometry': geom}]) == \
+        (None, None, None, None)
+
+
+def test_get_envelop_bbox():
+    collections = [
+        {'geometry': {'type': 'Point', 'coordinates': [1, 2]}},
+        {'geometry': {'type': 'Point', 'coordinates': []}},
+        {'features': [
+            {'geometry': None},
+            {'geometry': {'type': 'LineString',
+                          'coordinates': [[5, -1], [0, 3]]}},
+        ]},
+    ]
+    assert fetch.get_envelop_bbox(collections) == (0.0, -1.0, 5.0, 3.0)
+    assert fetch.get_envelop_bbox([]) == (None, None, None, None)
+
+
+@pytest.mark.parametrize('ids, expected', [
+    pytest.param(['x', 'y', 'z'], ['x', 'y', 'z'], id='distinct'),
+    pytest.param(['x', 'x', 'x'], ['x', 'x_2', 'x_3'], id='repeated'),
+    pytest.param(['x', 'x', 'x_2'], ['x', 'x_2', 'x_2_2'],
+                 id='clash-after'),
+    pytest.param(['x_2', 'x', 'x'], ['x_2', 'x', 'x_3'], id='clash-before'),
+    pytest.param(['x', 'x_2', 'x', 'x'], ['x', 'x_2', 'x_3', 'x_4'],
+                 id='clash-between'),
+])
+def test_get_unique_id(ids, expected):
+    id_counts = {}
+    assert [fetch.get_unique_id(i, id_counts) for i in ids] == expected